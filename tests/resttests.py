@@ -0,0 +1,990 @@
+import unittest
+import twilio
+import json
+import os
+import tempfile
+import threading
+import BaseHTTPServer
+import SocketServer
+
+class FakeTwilioHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    timeout = 0.5
+
+    def _respond(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else ''
+        with server.lock:
+            server.requests.append((self.command, self.path,
+                dict(self.headers.items()), body, self.client_address))
+            if server.responses:
+                status, headers, data = server.responses.pop(0)
+            elif server.route:
+                status, headers, data = server.route(self.command, self.path)
+            else:
+                status, headers, data = 200, {}, {'sid': 'XX123'}
+        if status is None:
+            # drop the connection after reading the request
+            self.close_connection = 1
+            return
+        if not isinstance(data, str):
+            data = json.dumps(data)
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_CONNECT = _respond
+
+    def log_message(self, *args):
+        pass
+
+class FakeTwilioServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+            FakeTwilioHandler)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.responses = []
+        self.route = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+class RestTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeTwilioServer()
+        self.thread = threading.Thread(target=self.server.serve_forever,
+            args=(0.01,))
+        self.thread.daemon = True
+        self.thread.start()
+        self.api_url = twilio._TWILIO_API_URL
+        twilio._TWILIO_API_URL = self.server.url
+        self.account = twilio.Account('AC123', 'token')
+
+    def tearDown(self):
+        twilio._TWILIO_API_URL = self.api_url
+        self.account.pool.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+class TestConnectionPool(RestTest):
+
+    def testKeepAlive(self):
+        """sequential requests should reuse a single connection"""
+        for i in range(3):
+            self.assertEquals(self.account.get_call('CA1'), {'sid': 'XX123'})
+        ports = set(r[4] for r in self.server.requests)
+        self.assertEquals(len(ports), 1)
+
+    def testAuthorization(self):
+        self.account.get_account()
+        headers = self.server.requests[0][2]
+        self.assertEquals(headers['authorization'], 'Basic QUMxMjM6dG9rZW4=')
+
+    def testPostBody(self):
+        self.account.send_sms_message('+1415', '+1212', 'Hello')
+        method, path, headers, body, client = self.server.requests[0]
+        self.assertEquals(method, 'POST')
+        self.assertEquals(path, '/2010-04-01/Accounts/AC123/SMS/Messages.json')
+        self.assertEquals(sorted(body.split('&')),
+            ['Body=Hello', 'From=%2B1212', 'To=%2B1415'])
+
+    def testIdleEviction(self):
+        """connections idle longer than idle_timeout are not reused"""
+        self.account.pool.idle_timeout = -1
+        self.account.get_call('CA1')
+        self.account.get_call('CA1')
+        ports = set(r[4] for r in self.server.requests)
+        self.assertEquals(len(ports), 2)
+
+    def testHTTPError(self):
+        self.server.responses.append((404, {}, {'message': 'not found'}))
+        try:
+            self.account.get_call('CA1')
+        except twilio.urllib2.HTTPError, e:
+            self.assertEquals(e.code, 404)
+            self.assertEquals(json.loads(e.read()), {'message': 'not found'})
+        else:
+            self.fail('HTTPError not raised')
+
+    def testThreads(self):
+        """concurrent requests each check out their own connection"""
+        results = []
+        def worker():
+            for i in range(5):
+                results.append(self.account.get_call('CA1'))
+        threads = [threading.Thread(target=worker) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEquals(len(results), 20)
+        self.assertTrue(len(self.account.pool._idle.values()[0]) <= 4)
+
+    def testDroppedGet(self):
+        """a GET dropped on a reused connection is sent again"""
+        pool = self.account.pool
+        url = self.server.url + '/x'
+        pool.urlopen('GET', url)
+        self.server.responses.append((None, {}, None))
+        response, data = pool.urlopen('GET', url)
+        self.assertEquals(response.status, 200)
+        self.assertEquals(len(self.server.requests), 3)
+
+    def testDroppedPost(self):
+        """a POST the server may have processed is not sent twice"""
+        pool = self.account.pool
+        url = self.server.url + '/x'
+        pool.urlopen('GET', url)
+        self.server.responses.append((None, {}, None))
+        self.assertRaises(twilio.httplib.HTTPException, pool.urlopen,
+            'POST', url, 'a=1')
+        self.assertEquals(len(self.server.requests), 2)
+
+    def testHttpProxy(self):
+        proxy = self.server.url.replace('http://', 'http://user:pass@')
+        pool = twilio.ConnectionPool(proxies={'http': proxy})
+        pool.urlopen('GET', 'http://api.example.invalid/x')
+        method, path, headers, body, client = self.server.requests[0]
+        self.assertEquals(path, 'http://api.example.invalid/x')
+        self.assertEquals(headers['proxy-authorization'],
+            'Basic dXNlcjpwYXNz')
+        pool.clear()
+
+    def testHttpsProxy(self):
+        """https requests go through a CONNECT tunnel"""
+        pool = twilio.ConnectionPool(proxies={'https': self.server.url})
+        self.server.responses.append((403, {}, {}))
+        self.assertRaises(twilio.socket.error, pool.urlopen, 'GET',
+            'https://api.example.invalid/x')
+        self.assertEquals(self.server.requests[0][:2],
+            ('CONNECT', 'api.example.invalid:443'))
+
+class TestSmsBulk(RestTest):
+
+    def testBulk(self):
+        messages = ({'to_number': '+1415%04d' % i, 'from_number': '+1212',
+            'body': 'Hello'} for i in range(25))
+        results = list(self.account.send_sms_bulk(messages, concurrency=5))
+        self.assertEquals(len(results), 25)
+        self.assertEquals(set(r.sid for r in results), set(['XX123']))
+        self.assertEquals(set(r.message['to_number'] for r in results),
+            set('+1415%04d' % i for i in range(25)))
+
+    def testTyped(self):
+        """the sid of a sent message is read from its SmsMessage"""
+        self.account.typed = True
+        results = list(self.account.send_sms_bulk([('+1', '+1212', 'Hi')]))
+        self.assertEquals((results[0].sid, results[0].error), ('XX123', None))
+
+    def testInvalidConcurrency(self):
+        self.assertRaises(ValueError, self.account.send_sms_bulk,
+            [('+1', '+1212', 'Hi')], concurrency=0)
+
+    def testErrors(self):
+        self.server.responses.append((400, {}, {'message': 'bad number'}))
+        results = list(self.account.send_sms_bulk([('+1', '+1212', 'Hi')]))
+        self.assertEquals(results[0].sid, None)
+        self.assertEquals(results[0].error.code, 400)
+
+    def setUp(self):
+        RestTest.setUp(self)
+        self.sleeps = []
+        self.sleep = twilio.time.sleep
+        twilio.time.sleep = self.sleeps.append
+
+    def tearDown(self):
+        twilio.time.sleep = self.sleep
+        RestTest.tearDown(self)
+
+    def testRetryTransient(self):
+        self.server.responses.append((429, {}, {'message': 'slow down'}))
+        results = list(self.account.send_sms_bulk([('+1', '+1212', 'Hi')]))
+        self.assertEquals(results[0].sid, 'XX123')
+        self.assertEquals(len(self.server.requests), 2)
+        self.assertFalse('i-twilio-idempotency-token' in
+            self.server.requests[0][2])
+
+    def testNoRetryAccepted(self):
+        """a message that may have been accepted is not sent again"""
+        self.server.responses.append((504, {}, {}))
+        results = list(self.account.send_sms_bulk([('+1', '+1212', 'Hi')]))
+        self.assertEquals(results[0].error.code, 504)
+        self.assertEquals(len(self.server.requests), 1)
+
+    def testRetryOwnKey(self):
+        self.server.responses.append((500, {}, {}))
+        results = list(self.account.send_sms_bulk([{'to_number': '+1',
+            'from_number': '+1212', 'body': 'Hi', 'idempotency_key': 'k1'}]))
+        self.assertEquals(results[0].sid, 'XX123')
+        self.assertEquals([r[2]['i-twilio-idempotency-token']
+            for r in self.server.requests], ['k1', 'k1'])
+
+    def testRetryNotSent(self):
+        """messages that never reached Twilio are retried"""
+        sock = twilio.socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        twilio._TWILIO_API_URL = 'http://127.0.0.1:%d' % sock.getsockname()[1]
+        sock.close()
+        results = list(self.account.send_sms_bulk([('+1', '+1212', 'Hi')]))
+        self.assertEquals(results[0].error.request_sent, False)
+        self.assertEquals(len(self.sleeps), 2)
+
+class TestRateLimiter(RestTest):
+
+    def setUp(self):
+        RestTest.setUp(self)
+        self.sleeps = []
+        self.sleep = twilio.time.sleep
+        twilio.time.sleep = self.sleeps.append
+
+    def tearDown(self):
+        twilio.time.sleep = self.sleep
+        RestTest.tearDown(self)
+
+    def testTokenBucket(self):
+        bucket = twilio.TokenBucket(10, 2)
+        self.assertEquals(bucket.reserve(), 0)
+        self.assertEquals(bucket.reserve(), 0)
+        self.assertAlmostEquals(bucket.reserve(), 0.1, 2)
+        self.assertAlmostEquals(bucket.reserve(), 0.2, 2)
+
+    def testEndpointFamily(self):
+        self.assertEquals(twilio._endpoint_family(
+            '/2010-04-01/Accounts/AC123/SMS/Messages.json?Page=1'),
+            'SMS/Messages')
+        self.assertEquals(twilio._endpoint_family(
+            '/2010-04-01/Accounts/AC123/Calls/CA1'), 'Calls')
+        self.assertEquals(twilio._endpoint_family(
+            '/2010-04-01/Accounts/AC123'), 'Accounts')
+
+    def testEndpoint(self):
+        base = '/2010-04-01/Accounts/AC123'
+        for path, endpoint in [(base, 'Accounts/{sid}'),
+            (base + '/Calls.json?Page=1', 'Calls'),
+            (base + '/Calls/CA1/Recordings', 'Calls/{sid}/Recordings'),
+            (base + '/SMS/Messages/SM1.json', 'SMS/Messages/{sid}')]:
+            self.assertEquals(twilio._endpoint(path), endpoint)
+
+    def testNumberRate(self):
+        self.account.rate_limiter = twilio.RateLimiter(number_rate=1)
+        self.account.send_sms_message('+1415', '+1212', 'Hi')
+        self.account.send_sms_message('+1415', '+1213', 'Hi')
+        self.assertEquals(self.sleeps, [])
+        self.account.send_sms_message('+1415', '+1212', 'Hi')
+        self.assertEquals(len(self.sleeps), 1)
+        self.account.get_sms_messages(from_number='+1212')
+        self.assertEquals(len(self.sleeps), 1)
+
+    def testFamilyRate(self):
+        self.account.rate_limiter = twilio.RateLimiter(
+            family_rates={'Calls': 1})
+        self.account.make_call('+1415', '+1212', 'http://example.com')
+        self.account.send_sms_message('+1415', '+1212', 'Hi')
+        self.assertEquals(self.sleeps, [])
+        self.account.make_call('+1415', '+1213', 'http://example.com')
+        self.assertEquals(len(self.sleeps), 1)
+
+class TestRetryPolicy(RestTest):
+
+    def setUp(self):
+        RestTest.setUp(self)
+        self.sleeps = []
+        self.sleep = twilio.time.sleep
+        twilio.time.sleep = self.sleeps.append
+
+    def tearDown(self):
+        twilio.time.sleep = self.sleep
+        RestTest.tearDown(self)
+
+    def testDefault(self):
+        """each account has its own default policy"""
+        other = twilio.Account('AC456', 'token')
+        self.assertFalse(self.account.retry_policy is other.retry_policy)
+        self.assertEquals(twilio.Account('AC456', 'token',
+            retry_policy=None).retry_policy, None)
+
+    def testRetryGet(self):
+        self.server.responses.append((503, {}, {}))
+        self.server.responses.append((502, {}, {}))
+        self.assertEquals(self.account.get_call('CA1'), {'sid': 'XX123'})
+        self.assertEquals(len(self.server.requests), 3)
+        self.assertEquals(len(self.sleeps), 2)
+
+    def testMaxAttempts(self):
+        for i in range(3):
+            self.server.responses.append((503, {}, {}))
+        self.assertRaises(twilio.urllib2.HTTPError, self.account.get_call,
+            'CA1')
+        self.assertEquals(len(self.server.requests), 3)
+
+    def testNoRetryPost(self):
+        """POST without an idempotency key should not be retried"""
+        self.server.responses.append((503, {}, {}))
+        self.assertRaises(twilio.urllib2.HTTPError,
+            self.account.make_call, '+1415', '+1212', 'http://example.com')
+        self.assertEquals(len(self.server.requests), 1)
+
+    def testRetryIdempotentPost(self):
+        self.server.responses.append((500, {}, {}))
+        self.account.make_call('+1415', '+1212', 'http://example.com',
+            idempotency_key='abc')
+        self.assertEquals(len(self.server.requests), 2)
+
+    def testRetryAfter(self):
+        self.server.responses.append((429, {'Retry-After': '7'}, {}))
+        self.account.get_calls()
+        self.assertEquals(self.sleeps, [7])
+
+    def testRetryAfterTooLong(self):
+        self.server.responses.append((429, {'Retry-After': '120'}, {}))
+        self.assertRaises(twilio.urllib2.HTTPError, self.account.get_calls)
+        self.assertEquals(self.sleeps, [])
+
+    def testNoClientErrorRetry(self):
+        self.server.responses.append((404, {}, {}))
+        self.assertRaises(twilio.urllib2.HTTPError, self.account.get_calls)
+        self.assertEquals(len(self.server.requests), 1)
+
+    def testBackoff(self):
+        policy = twilio.RetryPolicy(backoff=1, max_backoff=3, jitter=False)
+        error = twilio.HTTPErrorAppEngine('HTTP 503', 503)
+        self.assertEquals([policy.delay(i, error) for i in range(1, 5)],
+            [1, 2, 3, 3])
+
+class TestPagination(RestTest):
+
+    def setUp(self):
+        RestTest.setUp(self)
+        base = '/2010-04-01/Accounts/AC123/Calls.json?Status=completed'
+        self.server.responses = [
+            (200, {}, {'calls': [{'sid': 'CA1'}, {'sid': 'CA2'}],
+                'next_page_uri': base + '&Page=1&PageSize=2'}),
+            (200, {}, {'calls': [{'sid': 'CA3'}, {'sid': 'CA4'}],
+                'next_page_uri': base + '&Page=2&PageSize=2'}),
+            (200, {}, {'calls': [{'sid': 'CA5'}], 'next_page_uri': None}),
+        ]
+
+    def testIterCalls(self):
+        calls = self.account.iter_calls(status='completed', page_size=2)
+        self.assertEquals([c['sid'] for c in calls],
+            ['CA1', 'CA2', 'CA3', 'CA4', 'CA5'])
+        paths = [r[1] for r in self.server.requests]
+        self.assertEquals(sorted(paths[0].split('?')[1].split('&')),
+            ['PageSize=2', 'Status=completed'])
+        self.assertEquals(paths[1], '/2010-04-01/Accounts/AC123/Calls.json'
+            '?Status=completed&Page=1&PageSize=2')
+
+    def testLimit(self):
+        calls = list(self.account.iter_calls(status='completed', limit=3))
+        self.assertEquals([c['sid'] for c in calls], ['CA1', 'CA2', 'CA3'])
+        self.assertEquals(len(self.server.requests), 2)
+        self.assertTrue('PageSize=3' in self.server.requests[0][1])
+
+    def testLazy(self):
+        calls = self.account.iter_calls(status='completed')
+        self.assertEquals(len(self.server.requests), 0)
+        calls.next()
+        self.assertEquals(len(self.server.requests), 1)
+
+    def testPrefetch(self):
+        calls = self.account.iter_calls(status='completed', prefetch=True)
+        self.assertEquals([c['sid'] for c in calls],
+            ['CA1', 'CA2', 'CA3', 'CA4', 'CA5'])
+
+    def testStream(self):
+        calls = self.account.iter_calls(status='completed', stream=True)
+        self.assertEquals([c['sid'] for c in calls],
+            ['CA1', 'CA2', 'CA3', 'CA4', 'CA5'])
+        ports = set(r[4] for r in self.server.requests)
+        self.assertEquals(len(ports), 1)
+
+    def testStreamPrefetch(self):
+        calls = self.account.iter_calls(status='completed', stream=True,
+            prefetch=True)
+        self.assertEquals([c['sid'] for c in calls],
+            ['CA1', 'CA2', 'CA3', 'CA4', 'CA5'])
+
+    def testStreamLimit(self):
+        calls = self.account.iter_calls(status='completed', stream=True,
+            limit=3)
+        self.assertEquals([c['sid'] for c in calls], ['CA1', 'CA2', 'CA3'])
+        self.assertEquals(len(self.server.requests), 2)
+
+class TestJSONStream(unittest.TestCase):
+
+    def decode(self, data, key, chunk_size=3):
+        meta = {}
+        items = list(twilio._iter_json_list(twilio.StringIO(data), key, meta,
+            chunk_size))
+        return items, meta
+
+    def testDecode(self):
+        page = {'page': 0, 'uri': '/Calls.json', 'calls': [{'sid': 'CA1',
+            'price': -0.0125, 'flags': [True, None]}, {'sid': u'CA\u00e92'},
+            12345, [], {}], 'next_page_uri': None, 'total': 1234567}
+        data = json.dumps(page, indent=1)
+        for chunk_size in (1, 3, 7, 16384):
+            items, meta = self.decode(data, 'calls', chunk_size)
+            self.assertEquals(items, page.pop('calls'))
+            self.assertEquals(meta, page)
+            page = json.loads(data)
+
+    def testEmpty(self):
+        self.assertEquals(self.decode('{}', 'calls'), ([], {}))
+        self.assertEquals(self.decode('{"calls": [ ]}', 'calls'), ([], {}))
+
+    def testTruncated(self):
+        self.assertRaises(ValueError, self.decode, '{"calls": [{"sid": 1}',
+            'calls')
+        self.assertRaises(ValueError, self.decode, '{"calls": [1 2]}',
+            'calls')
+
+class TestExport(RestTest):
+
+    def setUp(self):
+        RestTest.setUp(self)
+        self.server.route = self.route
+
+    def route(self, method, path):
+        query = twilio.urlparse.parse_qs(path.split('?', 1)[1])
+        first, last = query['StartTime>='][0], query['StartTime<='][0]
+        if 'Page' in query:
+            return 200, {}, {'calls': [{'sid': last + '-2'}],
+                'next_page_uri': None}
+        return 200, {}, {'calls': [{'sid': last + '-1'}], 'next_page_uri':
+            path.replace('?', '?Page=1&')}
+
+    def testOrdered(self):
+        calls = self.account.export_calls('2010-08-01', '2010-08-05',
+            shard_days=2, workers=3)
+        self.assertEquals([c['sid'] for c in calls], ['2010-08-05-1',
+            '2010-08-05-2', '2010-08-03-1', '2010-08-03-2', '2010-08-01-1',
+            '2010-08-01-2'])
+        self.assertEquals(len(self.server.requests), 6)
+
+    def testUnordered(self):
+        messages = self.account.export_calls(twilio.datetime.date(2010, 8, 1),
+            '2010-08-04', workers=2, ordered=False)
+        self.assertEquals(len(list(messages)), 8)
+
+    def testInvalid(self):
+        for kwargs in ({'shard_days': 0}, {'shard_days': -1},
+            {'workers': 0}):
+            self.assertRaises(ValueError, self.account.export_calls,
+                '2010-08-01', '2010-08-05', **kwargs)
+        self.assertEquals(len(self.server.requests), 0)
+
+    def testClose(self):
+        """closing the export stops the queued shards"""
+        calls = self.account.export_calls('2010-01-01', '2010-03-31',
+            workers=2)
+        calls.next()
+        calls.close()
+        twilio.time.sleep(0.3)
+        self.assertTrue(len(self.server.requests) <= 6,
+            len(self.server.requests))
+
+    def testError(self):
+        self.server.route = lambda method, path: (404, {}, {})
+        calls = self.account.export_calls('2010-08-01', '2010-08-02')
+        self.assertRaises(twilio.urllib2.HTTPError, list, calls)
+
+class TestResources(RestTest):
+
+    CALL = {'sid': 'CA' + 'a' * 32, 'from': '+14158675309',
+        'to': '+14155551212', 'status': 'completed',
+        'date_created': 'Mon, 16 Aug 2010 03:45:01 +0000',
+        'start_time': None, 'subresource_uris': {'notifications': '/n.json'},
+        'annotation': 'extra'}
+
+    def setUp(self):
+        RestTest.setUp(self)
+        self.account.typed = True
+
+    def testCall(self):
+        self.server.responses.append((200, {}, self.CALL))
+        call = self.account.get_call(self.CALL['sid'])
+        self.assertTrue(isinstance(call, twilio.Call))
+        self.assertEquals(call.sid, self.CALL['sid'])
+        self.assertEquals(call.from_, '+14158675309')
+        self.assertEquals(call.date_created,
+            twilio.datetime.datetime(2010, 8, 16, 3, 45, 1))
+        self.assertEquals(call.start_time, None)
+        self.assertEquals(call.duration, None)
+        self.assertEquals(call.annotation, 'extra')
+        self.assertEquals(call.to_dict(), self.CALL)
+        self.assertRaises(AttributeError, getattr, call, 'body')
+        self.assertFalse(hasattr(call, '__dict__'))
+
+    def testList(self):
+        self.server.responses.append((200, {}, {'page': 0,
+            'calls': [self.CALL, self.CALL]}))
+        page = self.account.get_calls()
+        self.assertEquals(page['page'], 0)
+        self.assertEquals([c.sid for c in page['calls']],
+            [self.CALL['sid']] * 2)
+
+    def testIterStream(self):
+        self.server.responses.append((200, {}, {'sms_messages': [{'sid': 'SM1',
+            'body': 'Hi'}], 'next_page_uri': None}))
+        messages = list(self.account.iter_sms_messages(stream=True))
+        self.assertTrue(isinstance(messages[0], twilio.SmsMessage))
+        self.assertEquals(messages[0].body, 'Hi')
+
+    def testParticipant(self):
+        path = '/2010-04-01/Accounts/AC123/Conferences/CF%s/Participants/CA%s' \
+            % ('1' * 32, '2' * 32)
+        self.assertEquals(twilio._resource_type(path),
+            (twilio.Participant, True))
+        self.assertEquals(twilio._resource_type(path.rsplit('/', 1)[0]),
+            (twilio.Participant, False))
+
+    def testUntyped(self):
+        self.server.responses.append((200, {}, {'sid': 'AC123'}))
+        self.assertEquals(self.account.get_account(), {'sid': 'AC123'})
+
+class TestResponseCache(RestTest):
+
+    PN = 'PN' + 'a' * 32
+
+    def setUp(self):
+        RestTest.setUp(self)
+        self.account.cache = twilio.ResponseCache(maxsize=2, ttl=60,
+            ttls={'Calls': 0})
+
+    def testCached(self):
+        for i in range(3):
+            self.assertEquals(self.account.get_incoming_phone_number(self.PN),
+                {'sid': 'XX123'})
+        self.assertEquals(len(self.server.requests), 1)
+
+    def testParams(self):
+        self.account.get_incoming_phone_numbers(friendly_name='a')
+        self.account.get_incoming_phone_numbers(friendly_name='b')
+        self.account.get_incoming_phone_numbers(friendly_name='a')
+        self.assertEquals(len(self.server.requests), 2)
+
+    def testInvalidate(self):
+        self.account.get_incoming_phone_number(self.PN)
+        self.account.get_incoming_phone_numbers()
+        self.account.update_incoming_phone_number(self.PN, voice_url='x')
+        self.account.get_incoming_phone_number(self.PN)
+        self.account.get_incoming_phone_numbers()
+        self.assertEquals([r[0] for r in self.server.requests],
+            ['GET', 'GET', 'POST', 'GET', 'GET'])
+
+    def testInvalidateInFlight(self):
+        """a response fetched while the resource changed is not served"""
+        send = self.account._send
+        def changed(path, *args, **kwargs):
+            response = send(path, *args, **kwargs)
+            self.account.cache.invalidate(path)
+            return response
+        self.account._send = changed
+        self.account.get_incoming_phone_number(self.PN)
+        del self.account._send
+        self.account.get_incoming_phone_number(self.PN)
+        self.assertEquals(len(self.server.requests), 2)
+
+    def testInvalidateOther(self):
+        """changes to other resources keep the cached responses"""
+        self.account.get_incoming_phone_number(self.PN)
+        self.account.send_sms_message('+1415', '+1212', 'Hi')
+        self.account.get_incoming_phone_number(self.PN)
+        self.assertEquals(len(self.server.requests), 2)
+
+    def testTTL(self):
+        self.account.get_calls()
+        self.account.get_calls()
+        self.assertEquals(len(self.server.requests), 2)
+        self.account.get_incoming_phone_number(self.PN)
+        time, twilio.time.time = twilio.time.time, lambda: time() + 61
+        try:
+            self.account.get_incoming_phone_number(self.PN)
+        finally:
+            twilio.time.time = time
+        self.assertEquals(len(self.server.requests), 4)
+
+    def testLRU(self):
+        for sid in ('PN1', 'PN2', 'PN1', 'PN3', 'PN1', 'PN2'):
+            self.account.get_incoming_phone_number(sid)
+        self.assertEquals([r[1].split('/')[-1] for r in self.server.requests],
+            ['PN1.json', 'PN2.json', 'PN3.json', 'PN2.json'])
+
+class TestSharedCacheBackend(RestTest):
+
+    PN = 'PN' + 'a' * 32
+
+    def setUp(self):
+        RestTest.setUp(self)
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.backends = [twilio.SharedCacheBackend(self.path, slots=64,
+            slot_size=256) for i in range(2)]
+
+    def tearDown(self):
+        for backend in self.backends:
+            backend.close()
+        os.remove(self.path)
+        RestTest.tearDown(self)
+
+    def testShared(self):
+        first, second = self.backends
+        first.set('key', ('body', 1.5, None, u'x'))
+        self.assertEquals(second.get('key'), ('body', 1.5, None, u'x'))
+        second.delete('key')
+        self.assertEquals(first.get('key'), None)
+
+    def testTooLarge(self):
+        first, second = self.backends
+        first.set('key', 'small')
+        first.set('key', 'x' * 256)
+        self.assertEquals(second.get('key'), None)
+
+    def testClear(self):
+        first, second = self.backends
+        first.set('a', 1)
+        first.set('b', 2)
+        second.clear()
+        self.assertEquals((first.get('a'), first.get('b')), (None, None))
+
+    def testLockFailure(self):
+        """a failed file lock does not leave the slot locked"""
+        first = self.backends[0]
+        lockf = twilio.fcntl.lockf
+        def fail(*args):
+            raise IOError('interrupted')
+        twilio.fcntl.lockf = fail
+        try:
+            self.assertRaises(IOError, first.get, 'key')
+        finally:
+            twilio.fcntl.lockf = lockf
+        first.set('key', 1)
+        self.assertEquals(first.get('key'), 1)
+
+    def testInvalidate(self):
+        """a change made through one cache drops the responses cached by
+        the other"""
+        other = twilio.Account('AC123', 'token',
+            cache=twilio.ResponseCache(backend=self.backends[1]))
+        self.account.cache = twilio.ResponseCache(backend=self.backends[0])
+        self.account.get_incoming_phone_number(self.PN)
+        other.get_incoming_phone_number(self.PN)
+        self.assertEquals(len(self.server.requests), 1)
+        other.update_incoming_phone_number(self.PN, voice_url='x')
+        self.account.get_incoming_phone_number(self.PN)
+        self.assertEquals([r[0] for r in self.server.requests],
+            ['GET', 'POST', 'GET'])
+        other.pool.clear()
+
+class TestCoalesce(RestTest):
+
+    CF = 'CF' + 'a' * 32
+
+    def testCoalesce(self):
+        release = threading.Event()
+        def route(method, path):
+            release.wait(2)
+            return 200, {}, {'sid': self.CF}
+        self.server.route = route
+        self.account.coalesce = True
+        results = []
+        def get():
+            results.append(self.account.get_conference(self.CF))
+        threads = [threading.Thread(target=get) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        while not self.server.requests:
+            twilio.time.sleep(0.01)
+        twilio.time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(len(self.server.requests), 1)
+        self.assertEquals(len(results), 5)
+        self.assertTrue(all(r is results[0] for r in results))
+
+    def testSequential(self):
+        """only requests in flight at the same time are shared"""
+        self.account.coalesce = True
+        self.account.get_conference(self.CF)
+        self.account.get_conference(self.CF)
+        self.assertEquals(len(self.server.requests), 2)
+
+    def testError(self):
+        self.account.coalesce = True
+        self.server.responses.append((404, {}, {'message': 'not found'}))
+        self.assertRaises(Exception, self.account.get_conference, self.CF)
+        self.assertEquals(self.account.get_conference(self.CF), {'sid': 'XX123'})
+
+class TestConditionalGet(RestTest):
+
+    CA = 'CA' + 'a' * 32
+
+    def setUp(self):
+        RestTest.setUp(self)
+        self.account.cache = twilio.ResponseCache(ttl=0)
+
+    def testETag(self):
+        self.server.responses = [
+            (200, {'ETag': '"v1"'}, {'sid': self.CA, 'status': 'ringing'}),
+            (304, {}, ''),
+            (200, {'ETag': '"v2"'}, {'sid': self.CA, 'status': 'completed'}),
+            (304, {}, ''),
+        ]
+        statuses = [self.account.get_call(self.CA)['status'] for i in range(4)]
+        self.assertEquals(statuses,
+            ['ringing', 'ringing', 'completed', 'completed'])
+        sent = [r[2].get('if-none-match') for r in self.server.requests]
+        self.assertEquals(sent, [None, '"v1"', '"v1"', '"v2"'])
+
+    def testLastModified(self):
+        date = 'Mon, 16 Aug 2010 03:45:01 GMT'
+        self.server.responses = [(200, {'Last-Modified': date}, {'sid': 'a'}),
+            (304, {}, '')]
+        self.account.get_call(self.CA)
+        self.assertEquals(self.account.get_call(self.CA), {'sid': 'a'})
+        self.assertEquals(self.server.requests[1][2]['if-modified-since'],
+            date)
+
+    def testNoValidators(self):
+        """responses without validators are not kept when ttl is 0"""
+        self.account.get_call(self.CA)
+        self.account.get_call(self.CA)
+        self.assertEquals([r[2].get('if-none-match')
+            for r in self.server.requests], [None, None])
+
+    def testFresh(self):
+        self.account.cache.ttl = 60
+        self.server.responses = [(200, {'ETag': '"v1"'}, {'sid': 'a'})]
+        self.account.get_call(self.CA)
+        self.account.get_call(self.CA)
+        self.assertEquals(len(self.server.requests), 1)
+
+class RecordingTracer(twilio.Tracer):
+    def __init__(self):
+        self.started = []
+        self.traces = []
+
+    def start(self, trace):
+        self.started.append(trace)
+
+    def finish(self, trace):
+        self.traces.append(trace)
+
+class TestTracer(RestTest):
+
+    CA = 'CA' + 'a' * 32
+
+    def setUp(self):
+        RestTest.setUp(self)
+        self.account.tracer = self.tracer = RecordingTracer()
+        self.sleep = twilio.time.sleep
+        twilio.time.sleep = lambda seconds: None
+
+    def tearDown(self):
+        twilio.time.sleep = self.sleep
+        RestTest.tearDown(self)
+
+    def testTimings(self):
+        self.account.get_call(self.CA)
+        self.account.get_call(self.CA)
+        self.assertEquals(self.tracer.started, self.tracer.traces)
+        first, second = self.tracer.traces
+        self.assertEquals((first.method, first.family, first.status,
+            first.bytes, first.attempts, first.reused),
+            ('GET', 'Calls', 200, 16, 1, False))
+        self.assertEquals(sorted(first.timings),
+            ['connect', 'decode', 'dns', 'read', 'server', 'total'])
+        self.assertEquals(second.reused, True)
+        self.assertEquals(sorted(second.timings),
+            ['decode', 'read', 'server', 'total'])
+
+    def testRetry(self):
+        self.server.responses.append((503, {}, {}))
+        self.server.responses.append((404, {}, {}))
+        self.assertRaises(twilio.urllib2.HTTPError, self.account.get_call,
+            self.CA)
+        trace = self.tracer.traces[0]
+        self.assertEquals((trace.attempts, trace.status, trace.error.code),
+            (2, 404, 404))
+
+    def testCached(self):
+        self.account.cache = twilio.ResponseCache()
+        self.account.get_call(self.CA)
+        self.account.get_call(self.CA)
+        self.assertEquals([t.cached for t in self.tracer.traces],
+            [False, True])
+        self.assertEquals(self.tracer.traces[1].attempts, 0)
+
+    def testStream(self):
+        """every page of a stream is traced"""
+        base = '/2010-04-01/Accounts/AC123/Calls.json?Page=1'
+        self.server.responses = [
+            (200, {}, {'calls': [{'sid': 'CA1'}], 'next_page_uri': base}),
+            (200, {}, {'calls': [{'sid': 'CA2'}], 'next_page_uri': None}),
+        ]
+        calls = list(self.account.iter_calls(stream=True))
+        self.assertEquals(len(calls), 2)
+        self.assertEquals(self.tracer.started, self.tracer.traces)
+        self.assertEquals([(t.method, t.family, t.status, t.attempts)
+            for t in self.tracer.traces],
+            [('GET', 'Calls', 200, 1), ('GET', 'Calls', 200, 1)])
+        self.assertTrue('total' in self.tracer.traces[1].timings)
+
+    def testAppEngineStatus(self):
+        """the status App Engine returned is recorded"""
+        class Result(object):
+            status_code = 201
+            content = '{"sid": "CA1"}'
+            headers = {}
+        class URLFetch(object):
+            POST = 'POST'
+            def fetch(self, **kwargs):
+                return Result()
+        twilio.APPENGINE, twilio.urlfetch = True, URLFetch()
+        try:
+            self.account.make_call('+1415', '+1212', 'http://example.com')
+        finally:
+            twilio.APPENGINE = False
+            del twilio.urlfetch
+        trace = self.tracer.traces[0]
+        self.assertEquals((trace.status, trace.bytes), (201, 14))
+        self.assertEquals(sorted(trace.timings),
+            ['decode', 'server', 'total'])
+
+    def testHttpsConnection(self):
+        """timed https connections keep the https defaults"""
+        conn = twilio.ConnectionPool(proxies={})._new_connection('https',
+            'api.example.invalid')
+        self.assertEquals(conn.port, 443)
+        self.assertTrue(conn._context is not None)
+
+class TestMetricsRegistry(RestTest):
+
+    def trace(self, seconds, error=None):
+        trace = twilio.RequestTrace('GET',
+            '/2010-04-01/Accounts/AC123/Calls')
+        trace.timings['total'] = seconds
+        trace.error = error
+        return trace
+
+    def testRequests(self):
+        self.account.tracer = metrics = twilio.MetricsRegistry()
+        self.account.make_call('+1415', '+1212', 'http://example.com')
+        self.account.get_calls()
+        self.account.get_call('CA1')
+        self.server.responses.append((404, {}, {}))
+        self.assertRaises(twilio.urllib2.HTTPError,
+            self.account.send_sms_message, '+1415', '+1212', 'Hi')
+        snapshot = metrics.snapshot()
+        self.assertEquals(sorted(snapshot), ['GET Calls', 'GET Calls/{sid}',
+            'POST Calls', 'POST SMS/Messages'])
+        self.assertEquals((snapshot['GET Calls']['count'],
+            snapshot['GET Calls']['errors']), (1, 0))
+        self.assertEquals((snapshot['POST SMS/Messages']['count'],
+            snapshot['POST SMS/Messages']['errors']), (1, 1))
+        metrics.clear()
+        self.assertEquals(metrics.snapshot(), {})
+
+    def testPercentiles(self):
+        metrics = twilio.MetricsRegistry()
+        for ms in range(1, 101):
+            metrics.finish(self.trace(ms / 1000.0, ms % 10 == 0 or None))
+        stats = metrics.snapshot()['GET Calls']
+        self.assertEquals((stats['count'], stats['errors']), (100, 10))
+        for name, value in [('p50', 0.05), ('p95', 0.095), ('p99', 0.099),
+            ('max', 0.1)]:
+            self.assertTrue(value <= stats[name] <= value * 1.04,
+                (name, stats[name]))
+
+    def testThreads(self):
+        """each thread records into its own shard"""
+        metrics = twilio.MetricsRegistry()
+        def record():
+            for i in range(100):
+                metrics.finish(self.trace(0.01))
+        threads = [threading.Thread(target=record) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(metrics.snapshot()['GET Calls']['count'], 400)
+        # the shards of the exited threads were folded into one total
+        self.assertEquals(metrics._shards, [])
+        metrics.finish(self.trace(0.01))
+        self.assertEquals(len(metrics._shards), 1)
+        self.assertEquals(metrics.snapshot()['GET Calls']['count'], 401)
+
+    def testEmpty(self):
+        """histograms without requests are left out"""
+        metrics = twilio.MetricsRegistry()
+        metrics.finish(self.trace(0.01))
+        metrics._local.shard['POST Calls'] = twilio._Histogram()
+        self.assertEquals(metrics.snapshot().keys(), ['GET Calls'])
+
+class TestAsyncAccount(RestTest):
+
+    def setUp(self):
+        RestTest.setUp(self)
+        self.client = twilio.AsyncAccount('AC123', 'token', max_concurrency=4,
+            timeout=5)
+
+    def tearDown(self):
+        self.client.close()
+        RestTest.tearDown(self)
+
+    def testFutures(self):
+        futures = [self.client.get_call('CA%d' % i) for i in range(20)]
+        for f in futures:
+            self.assertEquals(f.result(), {'sid': 'XX123'})
+        self.assertEquals(len(self.server.requests), 20)
+
+    def testException(self):
+        self.server.responses.append((500, {}, {'message': 'error'}))
+        f = self.client.make_call('+1415', '+1212', 'http://example.com')
+        self.assertRaises(twilio.urllib2.HTTPError, f.result)
+        self.assertEquals(f.exception().code, 500)
+
+    def testCallback(self):
+        done = []
+        f = self.client.get_account()
+        f.add_done_callback(done.append)
+        f.result()
+        self.assertEquals(done, [f])
+
+    def testCallbackError(self):
+        """a failing callback does not stop the worker threads"""
+        def fail(future):
+            raise ValueError('callback')
+        workers = twilio._WorkerPool(1)
+        release = threading.Event()
+        done = []
+        twilio._log.disabled = True
+        try:
+            f = workers.submit(release.wait, 2)
+            f.add_done_callback(fail)
+            f.add_done_callback(done.append)
+            release.set()
+            f.result(2)
+            f.add_done_callback(fail)
+            self.assertEquals(workers.submit(len, 'abc').result(2), 3)
+        finally:
+            twilio._log.disabled = False
+            workers.shutdown()
+        self.assertEquals(done, [f])
+
+    def testTimeout(self):
+        f = twilio.Future()
+        self.assertRaises(twilio.RequestTimeout, f.result, 0.01)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+"""Benchmarks of the TwiML generator
+
+Times building, rendering and url quoting of representative responses and
+reports operations per second, along with the number of objects tracked by
+the garbage collector that one operation leaves allocated, e.g. the verbs
+and attribute dicts of a built response, and the peak memory allocated per
+operation when tracemalloc is available.
+
+    $ python twimlbench.py --save baseline.json
+    $ python twimlbench.py --compare baseline.json
+"""
+import gc
+import json
+import optparse
+import sys
+import time
+import twilio
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+NUMBERS = ','.join(['+1415555%04d' % i for i in range(200)])
+UNICODE = (u'\xbfHabla espa\xf1ol? \u4f60\u597d '
+    u'\u041f\u0440\u0438\u0432\u0435\u0442 ' * 4).encode('utf-8')
+
+def flat_says():
+    """Response with 50 Say verbs"""
+    r = twilio.Response()
+    for i in range(50):
+        r.addSay('Press %d for option %d' % (i % 10, i), loop=1)
+    return r
+
+def nested_gathers():
+    """Response with 10 Gather menus of Say, Play and Pause"""
+    r = twilio.Response()
+    for i in range(10):
+        g = r.addGather(action='/menu/%d?step=1&lang=en' % i, numDigits=1,
+            timeout=5)
+        g.addSay('Welcome to menu %d' % i, voice=twilio.Say.WOMAN)
+        g.addPlay('http://example.com/menu-%d.mp3' % i)
+        g.addPause(length=2)
+    r.addRedirect('/menu')
+    return r
+
+def large_dial():
+    """Dial ringing 200 numbers"""
+    r = twilio.Response()
+    r.addDial(NUMBERS, action='/dial-status', method=twilio.Dial.POST)
+    return r
+
+def unicode_says():
+    """Response with 20 Say verbs of utf-8 text"""
+    r = twilio.Response()
+    for i in range(20):
+        r.addSay(UNICODE, language=twilio.Say.SPANISH)
+    return r
+
+RESPONSES = [flat_says, nested_gathers, large_dial, unicode_says]
+
+def _rerender(response):
+    # drop the rendered document kept by toxml()
+    response._xml = None
+    return response.toxml()
+
+def _requote(response):
+    response._xml = None
+    return response.asUrl()
+
+def cases():
+    for build in RESPONSES:
+        response = build()
+        yield '%s build' % build.__name__, build
+        yield '%s render' % build.__name__, lambda r=response: _rerender(r)
+        yield '%s asUrl' % build.__name__, lambda r=response: _requote(r)
+
+def count_objects(fn):
+    """returns the number of objects tracked by the garbage collector which
+    are still allocated after one call of fn, its result included"""
+    gc.collect()
+    gc.disable()
+    try:
+        before = len(gc.get_objects())
+        result = fn()
+        return len(gc.get_objects()) - before
+    finally:
+        gc.enable()
+
+def measure(fn, seconds):
+    """returns the operations per second of fn, best of three runs, the
+    objects left allocated by one call and the peak bytes allocated by one
+    call or None"""
+    number = 1
+    while True:
+        start = time.time()
+        for i in xrange(number):
+            fn()
+        elapsed = time.time() - start
+        if elapsed > seconds / 10:
+            break
+        number *= 2
+
+    gc.collect()
+    best = None
+    for run in range(3):
+        start = time.time()
+        for i in xrange(number):
+            fn()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    objects = count_objects(fn)
+    peak = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            fn()
+            peak = tracemalloc.get_traced_memory()[1] - base
+        finally:
+            tracemalloc.stop()
+    return number / best, objects, peak
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] [name...]')
+    parser.add_option('--seconds', type='float', default=1.0,
+        help='approximate time spent on each benchmark')
+    parser.add_option('--save', metavar='FILE',
+        help='write the results to FILE')
+    parser.add_option('--compare', metavar='FILE',
+        help='compare the results with those saved in FILE')
+    options, names = parser.parse_args()
+
+    baseline = {}
+    if options.compare:
+        baseline = json.load(open(options.compare))
+
+    results = {}
+    for name, fn in cases():
+        if names and not [n for n in names if n in name]:
+            continue
+        ops, objects, peak = measure(fn, options.seconds)
+        results[name] = {'ops': ops, 'objects': objects, 'peak': peak}
+        line = '%-24s %12.0f ops/sec %6d objects' % (name, ops, objects)
+        if peak is not None:
+            line += ' %10d bytes' % peak
+        if name in baseline:
+            line += ' %+7.1f%%' % ((ops / baseline[name]['ops'] - 1) * 100)
+        print line
+        sys.stdout.flush()
+
+    if options.save:
+        json.dump(results, open(options.save, 'w'), indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import unittest
 import twilio
 import re
+from StringIO import StringIO
 
 class TwilioTest(unittest.TestCase):
     def strip(self, xml):
@@ -364,6 +365,204 @@ class TestGather(TwilioTest):
         self.assertRaises(twilio.TwilioException, verb.append, twilio.Dial())
         self.assertRaises(twilio.TwilioException, verb.append, twilio.Conference(""))
         self.assertRaises(twilio.TwilioException, verb.append, twilio.Sms(""))
+
+class TestSerializer(TwilioTest):
+
+    def testIndent(self):
+        """nested verbs and text spanning lines are indented"""
+        r = twilio.Response()
+        g = r.addGather(numDigits=1)
+        g.addSay("one\ntwo")
+        r.addHangup()
+        self.assertEquals(str(r), '<Response>\n\t<Gather numDigits="1">\n'
+            '\t\t<Say>one\n\t\ttwo</Say>\n\t</Gather>\n\t<Hangup/>\n'
+            '</Response>\n')
+
+    def testCompact(self):
+        r = twilio.Response()
+        g = r.addGather(numDigits=1)
+        g.addSay("one\ntwo")
+        r.addHangup()
+        self.assertEquals(r.toxml(compact=True), '<Response>'
+            '<Gather numDigits="1"><Say>one\ntwo</Say></Gather><Hangup/>'
+            '</Response>')
+
+class TestVerb(TwilioTest):
+
+    def testSlots(self):
+        """verbs have no instance dict and share their nestables"""
+        r = twilio.Response()
+        self.assertFalse(hasattr(r, '__dict__'))
+        self.assertTrue(r.nestables is twilio.Response().nestables)
+        self.assertEquals(r._verbs, None)
+        r.addSay("Hi")
+        self.assertEquals(len(r.verbs), 1)
+
+    def testVerbsList(self):
+        """verbs is a list even before anything was appended"""
+        r = twilio.Response()
+        r.verbs.append(twilio.Say("Hi"))
+        self.assertEquals(self.strip(r), "<Response><Say>Hi</Say></Response>")
+
+    def testRawAttrs(self):
+        """attributes are escaped when rendered"""
+        r = twilio.Gather(action='a?b=1&c="2"', numDigits=1)
+        self.assertEquals(r.attrs['action'], 'a?b=1&c="2"')
+        self.assertEquals(self.strip(r),
+            '<Gather action=\'a?b=1&amp;c="2"\' numDigits="1"/>')
+
+    def testMemoized(self):
+        """changes to nested verbs are rendered"""
+        r = twilio.Response()
+        g = r.addGather()
+        s = g.addSay("Hi")
+        str(r)
+        self.assertTrue(str(r) is str(r))
+        s.body = "Bye"
+        self.assertEquals(self.strip(r),
+            '<Response><Gather><Say>Bye</Say></Gather></Response>')
+        s.attrs['loop'] = 2
+        g.addPause()
+        self.assertEquals(self.strip(r), '<Response><Gather>'
+            '<Say loop="2">Bye</Say><Pause/></Gather></Response>')
+
+    def testAttrsTracked(self):
+        """attributes are tracked once reached after construction"""
+        g = twilio.Gather(numDigits=1)
+        self.assertTrue(g._attrs.__class__ is dict)
+        str(g)
+        str(g)
+        g.attrs['numDigits'] = 2
+        self.assertEquals(self.strip(g), '<Gather numDigits="2"/>')
+        attrs = {'timeout': 5}
+        g.attrs = attrs
+        attrs['timeout'] = 6
+        self.assertEquals(self.strip(g), '<Gather timeout="5"/>')
+
+class TestTwimlCache(TwilioTest):
+
+    def build(self, text):
+        r = twilio.Response()
+        r.addGather(numDigits=1).addSay(text)
+        return r
+
+    def testRender(self):
+        cache = twilio.TwimlCache(maxsize=2)
+        first = cache.render(self.build("Hi"))
+        self.assertEquals(first, str(self.build("Hi")))
+        self.assertTrue(cache.render(self.build("Hi")) is first)
+        self.assertEquals(cache.render(self.build("Bye")),
+            str(self.build("Bye")))
+        self.assertEquals(cache.render(self.build("Hi"), compact=True),
+            self.build("Hi").toxml(compact=True))
+        self.assertEquals(cache.asUrl(self.build("Hi")),
+            self.build("Hi").asUrl())
+
+    def testEqualValues(self):
+        """attribute values which compare equal may render differently"""
+        cache = twilio.TwimlCache()
+        for loop in (1, True, 1.0):
+            r = twilio.Response()
+            r.addSay("Hi", loop=loop)
+            self.assertEquals(cache.render(r), str(r))
+
+    def testLRU(self):
+        cache = twilio.TwimlCache(maxsize=2)
+        first = cache.render(self.build("1"))
+        cache.render(self.build("2"))
+        cache.render(self.build("1"))
+        cache.render(self.build("3"))
+        self.assertTrue(cache.render(self.build("1")) is first)
+        self.assertEquals(len(cache._entries), 2)
+
+    def testMemoizedVerbsList(self):
+        """changes made to the verbs list are rendered"""
+        r = twilio.Response()
+        r.addSay("a")
+        str(r)
+        r.verbs[0] = twilio.Say("b")
+        self.assertEquals(self.strip(r), "<Response><Say>b</Say></Response>")
+        c = twilio.Say("c")
+        str(r)
+        r.verbs.pop()
+        r.verbs.append(c)
+        self.assertEquals(self.strip(r), "<Response><Say>c</Say></Response>")
+        r.attrs = {'foo': 'bar'}
+        self.assertEquals(self.strip(r),
+            '<Response foo="bar"><Say>c</Say></Response>')
+
+class TestResponseWriter(TwilioTest):
+
+    def testStream(self):
+        """same document as the equivalent Response"""
+        fp = StringIO()
+        w = twilio.ResponseWriter(fp)
+        w.add(twilio.Say("Hi"))
+        w.open(twilio.Dial(action="x"))
+        for n in ("1", "2"):
+            w.add(twilio.Number(n))
+        w.close()
+        w.open(twilio.Gather())
+        w.finish()
+        r = twilio.Response()
+        r.addSay("Hi")
+        d = r.addDial(action="x")
+        d.addNumber("1")
+        d.addNumber("2")
+        r.addGather()
+        self.assertEquals(fp.getvalue(), str(r))
+
+    def testDrain(self):
+        w = twilio.ResponseWriter(compact=True)
+        w.add(twilio.Play("a.mp3"))
+        self.assertEquals(w.drain(), '<Response><Play>a.mp3</Play>')
+        w.finish()
+        self.assertEquals(w.drain(), '</Response>')
+
+    def testImproperNesting(self):
+        w = twilio.ResponseWriter()
+        w.open(twilio.Gather())
+        self.assertRaises(twilio.TwilioException, w.add, twilio.Dial())
+        w.finish()
+        self.assertRaises(twilio.TwilioException, w.add, twilio.Say("Hi"))
+        self.assertRaises(twilio.TwilioException, w.open, twilio.Say("Hi"))
+
+class TestTemplate(TwilioTest):
+
+    def build(self, greeting, url):
+        r = twilio.Response()
+        g = r.addGather(action=url, numDigits=1)
+        g.addSay(greeting)
+        r.addRedirect(url)
+        return r
+
+    def testRender(self):
+        """same document as building the response with the values"""
+        t = twilio.Template(self.build(twilio.Slot('greeting'),
+            twilio.Slot('url')))
+        self.assertEquals(t.slots, set(['greeting', 'url']))
+        for greeting, url in [('Hi & <bye>', 'http://a/?a=1&b="2"'),
+            ('one\ntwo', "it's"), ('', '')]:
+            self.assertEquals(t.render(greeting=greeting, url=url),
+                str(self.build(greeting, url)))
+
+    def testAsUrl(self):
+        t = twilio.Template(self.build(twilio.Slot('greeting'), 'x'))
+        self.assertEquals(t.asUrl(greeting='Hi'), self.build('Hi', 'x').asUrl())
+
+    def testInvalidSlots(self):
+        self.assertRaises(twilio.TwilioException, twilio.Slot, 'first-name')
+        self.assertRaises(twilio.TwilioException, twilio.Dial,
+            twilio.Slot('number'))
+        t = twilio.Dial()
+        t.addNumber(twilio.Slot('number'))
+        d = twilio.Dial()
+        d.addNumber('+1415')
+        self.assertEquals(twilio.Template(t).render(number='+1415'), str(d))
+
+    def testMissing(self):
+        t = twilio.Template(self.build(twilio.Slot('greeting'), 'x'))
+        self.assertRaises(twilio.TwilioException, t.render)
     
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import twilio
+import urllib
+from StringIO import StringIO
+
+class ValidateTest(unittest.TestCase):
+
+    URI = 'https://mycompany.com/myapp.php?foo=1&bar=2'
+    PARAMS = {'CallSid': 'CA1234567890ABCDE', 'Caller': '+14158675309',
+        'Digits': '1234', 'From': '+14158675309', 'To': '+18005551212'}
+    SIGNATURE = 'RSOYDt4T1cUTdK1PDd93/VVr8B8='
+
+    def setUp(self):
+        self.utils = twilio.Utils('AC123', '12345')
+
+class TestValidateRequest(ValidateTest):
+
+    def testValid(self):
+        for i in range(2):
+            self.assertTrue(self.utils.validateRequest(self.URI, self.PARAMS,
+                self.SIGNATURE))
+        self.assertTrue(self.utils.validateRequest(self.URI, self.PARAMS,
+            unicode(self.SIGNATURE)))
+
+    def testInvalid(self):
+        self.assertFalse(self.utils.validateRequest(self.URI + '&x=1',
+            self.PARAMS, self.SIGNATURE))
+        self.assertFalse(self.utils.validateRequest(self.URI, self.PARAMS,
+            self.SIGNATURE[:-1]))
+        self.assertFalse(self.utils.validateRequest(self.URI, self.PARAMS,
+            u'\u00e9' * len(self.SIGNATURE)))
+        self.assertFalse(self.utils.validateRequest(self.URI, self.PARAMS,
+            None))
+
+    def testToken(self):
+        """a new token is used once assigned"""
+        self.utils.token = 'other'
+        self.assertFalse(self.utils.validateRequest(self.URI, self.PARAMS,
+            self.SIGNATURE))
+
+    def testCompareDigest(self):
+        compare = twilio._hmac_compare_digest
+        twilio._hmac_compare_digest = None
+        try:
+            self.assertTrue(twilio._compare_digest('abc', 'abc'))
+            self.assertFalse(twilio._compare_digest('abc', 'abd'))
+        finally:
+            twilio._hmac_compare_digest = compare
+
+class TestValidateMany(ValidateTest):
+
+    def requests(self):
+        return [(self.URI, self.PARAMS, self.SIGNATURE),
+            (self.URI, self.PARAMS, 'invalid'),
+            (self.URI + '&x=1', self.PARAMS, self.SIGNATURE)] * 3
+
+    def testInline(self):
+        results = self.utils.validate_many(self.requests())
+        self.assertEquals(results.typecode, 'B')
+        self.assertEquals(list(results), [1, 0, 0] * 3)
+
+    def testProcesses(self):
+        results = self.utils.validate_many(iter(self.requests()),
+            processes=2, chunksize=2)
+        self.assertEquals(list(results), [1, 0, 0] * 3)
+
+    def testTokens(self):
+        """requests signed with any of the tokens are valid"""
+        self.utils.token = 'other'
+        self.assertEquals(list(self.utils.validate_many(self.requests())),
+            [0] * 9)
+        results = self.utils.validate_many(self.requests(),
+            tokens=['other', '12345'])
+        self.assertEquals(list(results), [1, 0, 0] * 3)
+        self.assertEquals(list(self.utils.validate_many([])), [])
+
+class TestWebhookApp(ValidateTest):
+
+    def environ(self, signature=None, method='POST'):
+        body = urllib.urlencode(self.PARAMS)
+        environ = {'REQUEST_METHOD': method, 'wsgi.url_scheme': 'https',
+            'HTTP_HOST': 'mycompany.com', 'SCRIPT_NAME': '',
+            'PATH_INFO': '/myapp.php', 'QUERY_STRING': 'foo=1&bar=2',
+            'CONTENT_LENGTH': str(len(body)), 'wsgi.input': StringIO(body),
+            'HTTP_X_TWILIO_SIGNATURE': signature or self.SIGNATURE}
+        return environ
+
+    def handler(self, params, environ):
+        self.params = params
+        r = twilio.Response()
+        r.addSay(u'Digits %s \u00e9' % params['Digits'])
+        return r
+
+    def call(self, app, environ):
+        self.status = self.headers = None
+        def start_response(status, headers):
+            self.status = status
+            self.headers = dict(headers)
+        return app(environ, start_response)
+
+    def testResponse(self):
+        app = twilio.WebhookApp(self.handler, '12345')
+        environ = self.environ()
+        body = self.call(app, environ)
+        self.assertEquals(self.status, '200 OK')
+        self.assertEquals(self.params, self.PARAMS)
+        self.assertTrue(environ['twilio.params'] is self.params)
+        self.assertEquals(body, [u'<Response>\n\t<Say>Digits 1234 \u00e9'
+            u'</Say>\n</Response>\n'.encode('utf-8')])
+        self.assertEquals(self.headers['Content-Length'], str(len(body[0])))
+        self.assertEquals(self.headers['Content-Type'],
+            'application/xml; charset=utf-8')
+
+    def testCache(self):
+        cache = twilio.TwimlCache()
+        app = twilio.WebhookApp(self.handler, '12345', cache=cache)
+        first = self.call(app, self.environ())
+        self.assertEquals(self.call(app, self.environ()), first)
+        self.assertEquals(len(cache._entries), 1)
+
+    def testInvalid(self):
+        app = twilio.WebhookApp(self.handler, '12345')
+        self.call(app, self.environ('invalid'))
+        self.assertEquals(self.status, '403 Forbidden')
+        self.call(app, self.environ(method='GET'))
+        self.assertEquals(self.status, '403 Forbidden')
+        app = twilio.WebhookApp(self.handler, None)
+        self.call(app, self.environ('invalid'))
+        self.assertEquals(self.status, '200 OK')
+
+if __name__ == '__main__':
+    unittest.main()